@@ -1,29 +1,34 @@
-from flask import Flask, request, jsonify
-from playwright.sync_api import sync_playwright
+from flask import Flask, request, jsonify, current_app
+from flask.json.provider import DefaultJSONProvider
 from pathlib import Path
-from urllib.parse import urlparse
-import urllib.robotparser
 from utils.robots import is_scraping_allowed
-from flask_cors import CORS
+from utils.browser import BrowserPool, BrowserPoolExhausted
+from utils.parser import extract_text_and_images
+from utils.html_cleaner import clean_html_response, MAX_HTML_CHARS, PROPERTY_CLASSES
 import os
-import fitz  # PyMuPDF
+import orjson
 import requests
-import pdfplumber
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from requests_toolbelt.multipart.encoder import MultipartEncoder
 import logging
 import sys
-import traceback
 from datetime import datetime
-from bs4 import BeautifulSoup
 import re
 import time
-from contextlib import timeout
-import gc
-import uuid
+import mimetypes
+import asyncio
 import shutil
+import tempfile
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import urlparse
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,  # Change from DEBUG to INFO
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s [%(levelname)s] %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)
@@ -32,18 +37,39 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Disable verbose logging from PDF processing libraries
-logging.getLogger('pdfminer').setLevel(logging.WARNING)
 logging.getLogger('PIL').setLevel(logging.WARNING)
 logging.getLogger('fitz').setLevel(logging.WARNING)
-logging.getLogger('pdfplumber').setLevel(logging.WARNING)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson's C encoder; scraped pages and PDF text can be large"""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str
+        obj = args[0] if len(args) == 1 else (args or kwargs)
+        return current_app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
 
 app = Flask(__name__)
-CORS(app)
+app.json = OrjsonProvider(app)
 
 
 # === CONFIG ===
 RAILS_BASE_URL = "https://workplacerback.onrender.com" 
 ORIGIN_URL = "https://workplacer-micro.onrender.com"
+ADD_IMAGES_URL_TEMPLATE = f"{RAILS_BASE_URL}/api/v1/spaces/{{}}/addimages"
+RAILS_HEADERS = {"Origin": ORIGIN_URL}
+
+# Keep-alive connection pool for uploads to Rails
+RAILS_SESSION = requests.Session()
+RAILS_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.3)
+))
 
 # Check both potential Chromium locations
 PLAYWRIGHT_PATHS = [
@@ -55,543 +81,559 @@ PLAYWRIGHT_PATHS = [
 PAGE_TIMEOUT = 15000  # 15 seconds
 NAVIGATION_TIMEOUT = 10000  # 10 seconds
 MAX_SCRAPE_TIME = 10  # 10 seconds total max time
+MAX_BROWSER_CONTEXTS = int(os.environ.get("MAX_BROWSER_CONTEXTS", 4))  # pooled contexts = concurrent scrapes per worker
+BROWSER_CONTEXT_MAX_USES = 20  # recycle a pooled context after this many scrapes
+BROWSER_CHECKOUT_TIMEOUT = 3  # seconds to wait for a free context before answering 503
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}  # only the HTML is needed
+BLOCKED_TRACKER_HOSTS = (  # analytics and ad hosts, matched with subdomains
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "hotjar.com", "clarity.ms", "adservice.google.com"
+)
+SCRAPE_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.93 Safari/537.36"
+STATIC_FETCH_TIMEOUT = 5  # seconds for the HTTP-first attempt
+MIN_STATIC_CONTENT = 500  # characters of cleaned content needed to skip the browser
+DOMAIN_MIN_INTERVAL = 1.5  # seconds between scrapes of the same host
+MAX_DOMAIN_WAIT = 3  # longest a scrape queues behind others to the same host before answering 429
+MAX_BATCH_URLS = 20  # URLs accepted by one /scrape_batch request
+
+# Keep-alive session for HTTP-first scrapes and robots.txt, so both reuse the same host connections
+SCRAPE_SESSION = requests.Session()
+SCRAPE_SESSION.headers["User-Agent"] = SCRAPE_USER_AGENT
+for prefix in ("http://", "https://"):
+    SCRAPE_SESSION.mount(prefix, HTTPAdapter(pool_connections=20, pool_maxsize=10))
+
+# PDF configs
+IMAGE_WORKERS = min(8, (os.cpu_count() or 1) * 2)  # threads for image extraction
+PDF_PROCESS_WORKERS = int(os.environ.get("PDF_PROCESS_WORKERS", 2))  # processes splitting large PDFs
+RAILS_UPLOAD_BATCH_SIZE = 4  # images per upload request
+RAILS_UPLOAD_WORKERS = 4  # concurrent upload requests
+SPOOL_PDF_BYTES = 4 * 1024 * 1024  # larger uploads are spooled to disk instead of held in memory
+MAX_PDF_BYTES = int(os.environ.get("MAX_PDF_BYTES", 100 * 1024 * 1024))  # uploads above this are rejected with 413
+PDF_EXTRACT_TIMEOUT = 120  # seconds; extraction workers stop at this deadline too
 # ==============
 
+# Werkzeug enforces this while reading the body, which also covers uploads without a Content-Length
+app.config["MAX_CONTENT_LENGTH"] = MAX_PDF_BYTES
+
+# Constant CORS headers for our single known caller; Flask already answers OPTIONS preflights per route
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": ORIGIN_URL,
+    "Access-Control-Allow-Methods": "POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+}
+
+@app.after_request
+def add_cors_headers(response):
+    response.headers.update(CORS_HEADERS)
+    return response
+
 @app.before_request
 def log_request_info():
-    """Log only essential request information"""
-    logger.info(f"New request: {request.method} {request.url}")
+    """Log only essential request information; body details are parsed only when DEBUG is on"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    # Path only: query strings can carry tokens or personal data
+    logger.info("New request: %s %s", request.method, request.path)
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     if request.is_json:
-        logger.info(f"Processing JSON request for URL: {request.get_json().get('url', 'No URL provided')}")
+        # Cached, so the route reuses this parse instead of decoding the body again
+        payload = request.get_json(silent=True, cache=True)
+        logger.debug("Processing JSON request for URL: %s", payload.get('url', 'No URL provided') if isinstance(payload, dict) else 'No URL provided')
     elif request.files:
-        logger.info(f"Processing file upload: {request.files.get('file').filename if request.files.get('file') else 'No file'}")
+        logger.debug("Processing file upload: %s", request.files.get('file').filename if request.files.get('file') else 'No file')
 
-def parse_pdf_text(pdf_path):
-    """Parse PDF text with optimized memory usage and timeout protection"""
-    text = []
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            total_pages = len(pdf.pages)
-            logger.info(f"Starting PDF text extraction: {total_pages} pages")
-            
-            # Process in chunks of 10 pages
-            for i in range(0, total_pages, 10):
-                chunk_end = min(i + 10, total_pages)
-                logger.info(f"Processing pages {i+1}-{chunk_end}")
-                chunk = pdf.pages[i:i+10]
-                
-                for page_num, page in enumerate(chunk, start=i):
-                    try:
-                        with timeout(seconds=30):
-                            page_text = page.extract_text() or ""
-                            text.append(page_text)
-                    except TimeoutError:
-                        logger.warning(f"Timeout on page {page_num + 1}")
-                        text.append(f"[Error: Timeout on page {page_num + 1}]")
-                    except Exception as e:
-                        logger.error(f"Error on page {page_num + 1}: {str(e)}")
-                        text.append(f"[Error on page {page_num + 1}]")
-                
-                # Clear memory after each chunk
-                del chunk
-                gc.collect()
-            
-            logger.info("PDF text extraction completed")
-            
-    except Exception as e:
-        logger.error(f"PDF parsing failed: {str(e)}")
-        raise
-        
-    return "\n\n".join(text).strip()
+TIMEOUT_EXECUTOR = ThreadPoolExecutor(thread_name_prefix="parse-timeout")
 
-class timeout:
+def run_with_timeout(seconds, fn, *args):
     """
-    Timeout context manager to prevent hanging on PDF processing
+    Run fn on a helper thread and stop waiting for it after `seconds`.
+    Works from any request thread, but the work itself is not interrupted.
     """
-    def __init__(self, seconds):
-        self.seconds = seconds
-
-    def __enter__(self):
-        def signal_handler(signum, frame):
-            raise TimeoutError("Timed out")
-        
-        import signal
-        signal.signal(signal.SIGALRM, signal_handler)
-        signal.alarm(self.seconds)
-
-    def __exit__(self, type, value, traceback):
-        import signal
-        signal.alarm(0)
-
-def extract_images_from_pdf(pdf_path, output_dir="/tmp/pdf_images"):
-    """Extract images with optimized memory usage and timeout protection"""
-    os.makedirs(output_dir, exist_ok=True)
-    image_paths = []
-    
-    try:
-        doc = fitz.open(pdf_path)
-        total_pages = len(doc)
-        logger.info(f"Starting image extraction: {total_pages} pages")
-        
-        # Process in chunks of 5 pages
-        for start_page in range(0, total_pages, 5):
-            try:
-                with timeout(seconds=30):
-                    end_page = min(start_page + 5, total_pages)
-                    logger.info(f"Processing images from pages {start_page+1}-{end_page}")
-                    
-                    for page_num in range(start_page, end_page):
-                        page = doc[page_num]
-                        images = page.get_images(full=True)
-                        
-                        if images:
-                            logger.info(f"Found {len(images)} images on page {page_num + 1}")
-                        
-                        for i, img in enumerate(images):
-                            try:
-                                xref = img[0]
-                                base_image = doc.extract_image(xref)
-                                image_bytes = base_image["image"]
-                                ext = base_image["ext"]
-                                
-                                # Skip if image is too large
-                                if len(image_bytes) > 10 * 1024 * 1024:
-                                    logger.warning(f"Skipping large image ({len(image_bytes)/1024/1024:.1f}MB) on page {page_num + 1}")
-                                    continue
-                                    
-                                img_filename = f"page{page_num+1}_img{i+1}.{ext}"
-                                img_path = os.path.join(output_dir, img_filename)
-                                
-                                with open(img_path, "wb") as f:
-                                    f.write(image_bytes)
-                                
-                                image_paths.append(img_path)
-                                
-                                # Clear memory
-                                del image_bytes
-                                del base_image
-                                
-                            except Exception as e:
-                                logger.error(f"Failed to extract image {i+1} from page {page_num + 1}: {str(e)}")
-                                continue
-                        
-                        # Clear page from memory
-                        page = None
-                        
-                # Force garbage collection after each chunk
-                gc.collect()
-                        
-            except TimeoutError:
-                logger.warning(f"Timeout processing images on pages {start_page+1}-{end_page}")
-                continue
-                
-        logger.info(f"Image extraction completed. Found {len(image_paths)} images")
-                
-    except Exception as e:
-        logger.error(f"Image extraction failed: {str(e)}")
-        raise
-    finally:
-        if 'doc' in locals():
-            doc.close()
-            
-    return image_paths
-
-def send_images_to_rails(image_paths, space_id):
-    url = f"{RAILS_BASE_URL}/api/v1/spaces/{space_id}/addimages"
-    files = [("imgs[]", open(path, "rb")) for path in image_paths]
-    headers = {'Origin': ORIGIN_URL}
+    return TIMEOUT_EXECUTOR.submit(fn, *args).result(timeout=seconds)
 
+def _post_image_batch(url, image_paths):
+    """Stream one batch of images to Rails as a multipart body instead of buffering every file"""
     try:
-        response = requests.post(url, files=files, headers=headers)
-        for _, f in files:
-            f.close()
+        with ExitStack() as stack:
+            fields = [
+                ("imgs[]", (
+                    os.path.basename(path),
+                    stack.enter_context(open(path, "rb")),
+                    mimetypes.guess_type(path)[0] or "application/octet-stream"
+                ))
+                for path in image_paths
+            ]
+            encoder = MultipartEncoder(fields)
+            headers = {**RAILS_HEADERS, 'Content-Type': encoder.content_type}
+            response = RAILS_SESSION.post(url, data=encoder, headers=headers)
         return response.json() if response.status_code == 200 else {"error": response.text}
     except Exception as e:
         return {"error": str(e)}
 
-# === ROBOTS.TXT + SCRAPE ===
-def is_scraping_allowed(url):
-    parsed_url = urlparse(url)
-    robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
+def _read_upload(file, temp_dir):
+    """Return the uploaded PDF as bytes, or as a path in temp_dir when it exceeds SPOOL_PDF_BYTES"""
+    head = file.stream.read(SPOOL_PDF_BYTES + 1)
+    if len(head) <= SPOOL_PDF_BYTES:
+        return head
 
-    rp = urllib.robotparser.RobotFileParser()
-    rp.set_url(robots_url)
+    path = os.path.join(temp_dir, "upload.pdf")
+    with open(path, "wb") as out:
+        out.write(head)
+        shutil.copyfileobj(file.stream, out, length=1024 * 1024)
+    return path
 
-    try:
-        rp.read()
-        return rp.can_fetch("*", url)
-    except Exception as e:
-        print(f"⚠️ robots.txt check failed: {e}")
-        return False
-   
+class RailsImageUpload:
+    """
+    Uploads image batches to Rails in parallel as they are submitted, so uploading
+    overlaps with the extraction that is still producing images.
+    """
+    def __init__(self, space_id):
+        self.url = ADD_IMAGES_URL_TEMPLATE.format(space_id)
+        self._executor = ThreadPoolExecutor(max_workers=RAILS_UPLOAD_WORKERS, thread_name_prefix="rails-upload")
+        self._futures = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, image_paths):
+        """Queue image_paths for upload in RAILS_UPLOAD_BATCH_SIZE batches; safe to call from any thread"""
+        with self._lock:
+            # An extraction thread abandoned by a timeout can still deliver images after the response
+            if self._closed:
+                logger.warning("Dropping %s images extracted after the upload was closed", len(image_paths))
+                return
+            for i in range(0, len(image_paths), RAILS_UPLOAD_BATCH_SIZE):
+                batch = image_paths[i:i + RAILS_UPLOAD_BATCH_SIZE]
+                self._futures.append(self._executor.submit(_post_image_batch, self.url, batch))
+
+    def close(self, cancel_pending=False):
+        """Stop accepting batches (later submit() calls are no-ops); idempotent"""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=cancel_pending)
+
+    def __len__(self):
+        return len(self._futures)
+
+    def result(self, timeout):
+        """Wait for every queued batch; a single batch returns Rails' response unchanged"""
+        deadline = time.monotonic() + timeout
+        responses = [future.result(timeout=max(0, deadline - time.monotonic())) for future in self._futures]
+
+        if len(responses) == 1:
+            return responses[0]
+        merged = {"batches": responses}
+        errors = [r["error"] for r in responses if isinstance(r, dict) and "error" in r]
+        if errors:
+            merged["error"] = "; ".join(errors)
+        return merged
+
+# === SCRAPE ===
+@functools.lru_cache(maxsize=1)
 def find_chromium_executable():
     # First check our predefined paths
     for path in PLAYWRIGHT_PATHS:
         if os.path.exists(path):
-            print(f"✅ Chromium executable found at predefined path: {path}")
+            logger.debug("✅ Chromium executable found at predefined path: %s", path)
             return path
 
     # Fallback to searching in the cache directory
     base = Path.home() / ".cache/ms-playwright"
-    print("🗂 Checking Chromium install path:", base)
+    logger.debug("🗂 Checking Chromium install path: %s", base)
 
     if not base.exists():
-        print("⚠️ Base playwright directory not found")
-        # Try to install playwright browsers
-        os.system("playwright install chromium")
+        # Browsers are installed at build time (Dockerfile / render.yaml), never from a request
+        logger.debug("⚠️ Base playwright directory not found")
 
     folders = list(base.glob("chromium-*"))
-    print("📁 Chromium folders found:", folders)
+    logger.debug("📁 Chromium folders found: %s", folders)
 
     for item in folders:
         executable = item / "chrome-linux/chrome"
         if executable.exists():
-            print("✅ Chromium executable found at:", executable)
+            logger.debug("✅ Chromium executable found at: %s", executable)
             return str(executable)
 
-    print("❌ Chromium executable not found in any location")
     raise FileNotFoundError("Chromium executable not found. Please ensure Playwright browsers are installed.")
 
-async def scrape_with_playwright(url):
+# Startup check: the request path never installs browsers, so fail fast and let Render restart us
+try:
+    CHROMIUM_EXECUTABLE = find_chromium_executable()
+except FileNotFoundError as e:
+    logger.critical("❌ %s", e)
+    sys.exit(1)
+
+def _is_tracker(url):
+    host = urlparse(url).hostname or ""
+    return any(host == blocked or host.endswith("." + blocked) for blocked in BLOCKED_TRACKER_HOSTS)
+
+async def _block_heavy_resources(route):
+    """Abort requests for assets and trackers that the HTML extraction never looks at"""
+    resource = route.request
+    if resource.resource_type in BLOCKED_RESOURCE_TYPES or _is_tracker(resource.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def _setup_browser_context(context):
+    # Routed on the context so popups and the page share the same blocking
+    await context.route("**/*", _block_heavy_resources)
+
+# One browser per worker process, launched once and shared by every /scrape request
+BROWSER_POOL = BrowserPool(
+    CHROMIUM_EXECUTABLE,
+    max_contexts=MAX_BROWSER_CONTEXTS,
+    max_context_uses=BROWSER_CONTEXT_MAX_USES,
+    context_options={
+        "user_agent": SCRAPE_USER_AGENT,
+        "viewport": {"width": 1280, "height": 800},
+        "service_workers": "block"  # a worker registered by one site must not serve later scrapes
+    },
+    setup_context=_setup_browser_context
+)
+BROWSER_POOL.start()
+
+# Client-side rendered shells: an empty mount point, or a noscript asking for JavaScript
+EMPTY_APP_ROOT_RE = re.compile(r"""<div[^>]+id=["'](?:root|app|__next)["'][^>]*>\s*</div>""", re.IGNORECASE)
+NOSCRIPT_JS_RE = re.compile(r'<noscript[^>]*>[^<]*enable javascript', re.IGNORECASE)
+
+def needs_browser(html_content, cleaned_data):
+    """Decide whether server-rendered HTML is enough or the page must be rendered in Chromium"""
+    content_text = cleaned_data.get("content", "")
+    if len(content_text) < MIN_STATIC_CONTENT or "cookie" in content_text[:100].lower():
+        return True
+    return bool(EMPTY_APP_ROOT_RE.search(html_content) or NOSCRIPT_JS_RE.search(html_content))
+
+_domain_next_slot = {}  # netloc -> monotonic time of the next allowed scrape
+_domain_lock = threading.Lock()
+
+class DomainBusy(Exception):
+    """The host's scrape queue is longer than MAX_DOMAIN_WAIT"""
+
+def _wait_for_domain_slot(url):
+    """
+    Space scrapes of the same host at least DOMAIN_MIN_INTERVAL apart, without holding the lock while waiting.
+    Raises DomainBusy rather than parking a request thread for more than MAX_DOMAIN_WAIT.
+    """
+    netloc = urlparse(url).netloc
+    with _domain_lock:
+        now = time.monotonic()
+        slot = max(now, _domain_next_slot.get(netloc, 0))
+        if slot - now > MAX_DOMAIN_WAIT:
+            raise DomainBusy(f"{netloc} is busy for another {slot - now:.1f}s")
+        _domain_next_slot[netloc] = slot + DOMAIN_MIN_INTERVAL
+        if len(_domain_next_slot) > 1024:
+            for host in [h for h, t in _domain_next_slot.items() if t < now]:
+                del _domain_next_slot[host]
+    if slot > now:
+        time.sleep(slot - now)
+
+def _decode_html(body, charset=None):
+    """Decode a fetched page: a header charset wins, then the page's own <meta charset>, then detection"""
+    from bs4 import UnicodeDammit
+    dammit = UnicodeDammit(body, known_definite_encodings=[charset] if charset else [], is_html=True)
+    return dammit.unicode_markup if dammit.unicode_markup is not None else body.decode("utf-8", "replace")
+
+def _read_html_body(response, deadline):
+    """
+    Read at most MAX_HTML_CHARS bytes of the body; None if the scrape deadline passes first.
+    The deadline is checked between 16KB chunks.
+    """
+    chunks, size = [], 0
+    for chunk in response.iter_content(16 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= MAX_HTML_CHARS:
+            body = b"".join(chunks)[:MAX_HTML_CHARS]
+            # Cut at the last tag end so no multi-byte character is split, which would
+            # make UnicodeDammit give up on the real encoding
+            return body[:body.rfind(b">") + 1] or body
+        if time.monotonic() > deadline:
+            return None
+    return b"".join(chunks)
+
+def scrape_static(url, deadline):
+    """
+    HTTP-first scrape: fetch the page with a plain GET and clean it.
+    Returns None when the page needs a real browser. deadline (a time.monotonic() value)
+    bounds the whole fetch, not just each socket read.
+    """
+    start_time = time.time()
+    try:
+        timeout = max(0.1, min(STATIC_FETCH_TIMEOUT, deadline - time.monotonic()))
+        # Streamed, so PDFs and other non-HTML bodies are rejected on their headers alone
+        with SCRAPE_SESSION.get(url, timeout=timeout, stream=True) as response:
+            status = response.status_code
+            content_type = response.headers.get("Content-Type", "")
+            if status >= 400 or "html" not in content_type:
+                return None
+            body = _read_html_body(response, deadline)
+            # requests assumes ISO-8859-1 for a bare text/html; only trust its guess for an explicit charset
+            charset = response.encoding if "charset" in content_type.lower() else None
+    except requests.RequestException as e:
+        logger.info("Static fetch failed, falling back to browser: %s", e)
+        return None
+
+    if body is None:
+        logger.info("Static fetch ran out of time, falling back to browser")
+        return None
+
+    html_content = _decode_html(body, charset)
+    cleaned_data = clean_html_response(html_content)
+    if needs_browser(html_content, cleaned_data):
+        logger.info("🧭 Static HTML looks client-rendered, using browser")
+        return None
+
+    elapsed_time = time.time() - start_time
+    logger.info("⚡ Static scrape completed in %.2f seconds", elapsed_time)
+    cleaned_data["metadata"] = {
+        "scrape_time": elapsed_time,
+        "url": url,
+        "status_code": status,
+        "renderer": "http",
+        "timestamp": datetime.now().isoformat()
+    }
+    return cleaned_data
+
+def _remaining_ms(deadline):
+    """Milliseconds left before the scrape deadline, floored so calls can still fail cleanly"""
+    return max(100, int((deadline - time.monotonic()) * 1000))
+
+# Content containers the browser waits for. Classes match as whole tokens, since substrings
+# like "main" or "article" also hit "main-menu", "domain" or "article-list" in page chrome
+CONTENT_READY_SELECTOR = ", ".join(['main', 'article'] + [f'[class~="{cls}" i]' for cls in PROPERTY_CLASSES])
+
+# Cookie consent buttons: CSS selectors first, then buttons/links whose text contains an accept phrase
+CONSENT_BUTTON_SELECTORS = [
+    # General accept buttons
+    'button[id*="accept"]', 'button[class*="accept"]',
+    'a[id*="accept"]', 'a[class*="accept"]',
+
+    # Common cookie consent button IDs/classes
+    '#onetrust-accept-btn-handler', '.cookie-accept-button',
+    '#accept-all-cookies', '.accept-cookies-button',
+    '#accept-cookies', '.cookie-accept',
+    '#acceptCookies', '#CybotCookiebotDialogBodyButtonAccept',
+    '#gdpr-cookie-accept', '#cookie-notice-accept-button',
+
+    # Common consent interfaces
+    '[aria-label="Accept cookies"]', '[data-testid="cookie-accept"]',
+    '[data-action="accept-cookies"]', '[data-action="accept-all"]'
+]
+CONSENT_BUTTON_TEXTS = ['accept', 'godkänn']  # 'accept' also covers 'Accept all' and 'Acceptera'
+CLICK_CONSENT_JS = """([selectors, texts]) => {
+    for (const selector of selectors) {
+        const el = document.querySelector(selector);
+        if (el) { el.click(); return selector; }
+    }
+    for (const el of document.querySelectorAll('button, a')) {
+        const text = (el.textContent || '').trim().toLowerCase();
+        if (texts.some(t => text.includes(t))) { el.click(); return text.slice(0, 40); }
+    }
+    return null;
+}"""
+# Resolves true once the DOM has had no mutations for quiet_ms, or false after max_ms
+WAIT_FOR_DOM_QUIET_JS = """([quietMs, maxMs]) => new Promise(resolve => {
+    if (!document.body) { resolve(true); return; }
+    let quietTimer;
+    const finish = settled => { observer.disconnect(); clearTimeout(quietTimer); clearTimeout(maxTimer); resolve(settled); };
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(() => finish(true), quietMs);
+    });
+    observer.observe(document.body, {subtree: true, childList: true, characterData: true});
+    quietTimer = setTimeout(() => finish(true), quietMs);
+    const maxTimer = setTimeout(() => finish(false), maxMs);
+})"""
+
+async def scrape_with_playwright(url, deadline=None):
     """
     Scrape a website using Playwright.
     This version includes better cookie consent handling and content loading detection.
+    deadline (a time.monotonic() value) defaults to MAX_SCRAPE_TIME from now.
     """
-    logger.info(f"🌐 Scraping URL: {url}")
+    logger.info("🌐 Scraping URL: %s", url)
     start_time = time.time()
+    if deadline is None:
+        deadline = time.monotonic() + MAX_SCRAPE_TIME
     
-    browser = None
     try:
-        chromium_path = find_chromium_executable()
-        logger.info(f"🔍 Using Chromium at {chromium_path}")
-        
-        # Launch browser with custom settings
-        browser = await playwright.chromium.launch(
-            executable_path=chromium_path if chromium_path else None,
-            headless=True
-        )
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.93 Safari/537.36",
-            viewport={"width": 1280, "height": 800}
-        )
-        
-        # Add storage state for persistence if needed
-        await context.add_cookies([{
-            "name": "cookieConsent", 
-            "value": "true", 
-            "domain": "."+".".join(url.split('/')[2].split('.')[-2:]),
-            "path": "/"
-        }])
-        
-        page = await context.new_page()
-        
-        # Set long timeout for navigation
-        await page.set_default_timeout(30000)
-        
-        logger.info(f"⌛ Navigating to URL...")
-        response = await page.goto(url)
-        
-        # Check response status
-        if not response:
-            logger.error("❌ Failed to get response from page")
-            return {"error": "No response from page"}
-        
-        status = response.status
-        logger.info(f"🔢 Response status: {status}")
-        
-        if status >= 400:
-            logger.error(f"❌ Error status code: {status}")
-            return {"error": f"HTTP error: {status}"}
-        
-        # Wait for network to be idle
-        await page.wait_for_load_state("networkidle")
-        logger.info("🛑 Network is idle")
-        
-        # Handle cookie consent - try multiple common selectors
-        consent_buttons = [
-            # General accept buttons
-            'button[id*="accept"]', 'button[class*="accept"]', 
-            'button:has-text("Accept")', 'button:has-text("Accept all")',
-            'button:has-text("Godkänn")', 'button:has-text("Acceptera")',
-            'a[id*="accept"]', 'a[class*="accept"]',
-            'a:has-text("Accept")', 'a:has-text("Accept all")',
-            
-            # Common cookie consent button IDs/classes
-            '#onetrust-accept-btn-handler', '.cookie-accept-button',
-            '#accept-all-cookies', '.accept-cookies-button',
-            '#accept-cookies', '.cookie-accept',
-            '#acceptCookies', '#CybotCookiebotDialogBodyButtonAccept',
-            '#gdpr-cookie-accept', '#cookie-notice-accept-button',
-            
-            # Common consent interfaces
-            '[aria-label="Accept cookies"]', '[data-testid="cookie-accept"]',
-            '[data-action="accept-cookies"]', '[data-action="accept-all"]'
-        ]
-        
-        # Try to accept cookies
-        for selector in consent_buttons:
+        async with BROWSER_POOL.context(checkout_timeout=BROWSER_CHECKOUT_TIMEOUT) as context:
+            # Add storage state for persistence if needed
+            await context.add_cookies([{
+                "name": "cookieConsent", 
+                "value": "true", 
+                "domain": "."+".".join(url.split('/')[2].split('.')[-2:]),
+                "path": "/"
+            }])
+        
+            page = await context.new_page()
+        
+            # Every Playwright call shares what is left of the request budget
+            page.set_default_timeout(_remaining_ms(deadline))
+        
+            logger.info("⌛ Navigating to URL...")
+            response = await page.goto(url, wait_until="domcontentloaded")
+        
+            # Check response status
+            if not response:
+                logger.error("❌ Failed to get response from page")
+                return {"error": "No response from page"}
+        
+            status = response.status
+            logger.info("🔢 Response status: %s", status)
+        
+            if status >= 400:
+                logger.error("❌ Error status code: %s", status)
+                return {"error": f"HTTP error: {status}"}
+        
+            # Nothing to clean on PDFs, images or JSON; skip consent handling and parsing entirely
+            content_type = response.headers.get("content-type", "")
+            if content_type and "html" not in content_type:
+                logger.error("❌ Not an HTML page: %s", content_type)
+                return {"error": f"Unsupported content type: {content_type}"}
+        
+            # Try to accept cookies with one in-page pass instead of a round-trip per selector
+            page.set_default_timeout(_remaining_ms(deadline))
             try:
-                logger.info(f"🍪 Looking for consent button: {selector}")
-                if await page.locator(selector).count() > 0:
-                    await page.locator(selector).click(timeout=2000)
-                    logger.info(f"🍪 Clicked consent button: {selector}")
-                    # Wait for potential overlay to disappear
-                    await page.wait_for_timeout(1000)
-                    break
+                clicked = await page.evaluate(CLICK_CONSENT_JS, [CONSENT_BUTTON_SELECTORS, CONSENT_BUTTON_TEXTS])
             except Exception as e:
-                # Just log and continue to next selector
-                logger.debug(f"Couldn't click {selector}: {str(e)}")
-                continue
+                clicked = None
+                logger.debug("Couldn't run consent click: %s", e)
         
-        # Wait a bit for page to settle after cookie interactions
-        await page.wait_for_timeout(1000)
+            if clicked:
+                logger.info("🍪 Clicked consent button: %s", clicked)
         
-        # Wait for content to stabilize by checking for DOM size changes
-        previous_content_size = 0
-        stable_count = 0
-        max_stabilize_checks = 5
-        
-        for i in range(max_stabilize_checks):
-            # Get the current content size
-            content_size = await page.evaluate('''() => {
-                return document.body.innerHTML.length;
-            }''')
-            
-            logger.debug(f"Content size check {i+1}: {content_size} bytes")
-            
-            # If content size is stable, increment counter
-            if abs(content_size - previous_content_size) < 100:
-                stable_count += 1
-                if stable_count >= 2:  # Content is considered stable after 2 consecutive stable checks
-                    logger.info(f"✅ Content appears stable after {i+1} checks")
-                    break
+            # Proceed as soon as a content container exists instead of waiting on trailing network traffic
+            try:
+                await page.wait_for_selector(CONTENT_READY_SELECTOR, state="attached", timeout=min(5000, _remaining_ms(deadline)))
+            except Exception:
+                logger.debug("No content container appeared, continuing with the DOM as loaded")
+        
+            # Wait for content to stabilize: one in-page observer instead of polling the body size
+            page.set_default_timeout(_remaining_ms(deadline))
+            settled = await page.evaluate(WAIT_FOR_DOM_QUIET_JS, [1000, min(5000, _remaining_ms(deadline))])
+            if settled:
+                logger.info("✅ Content appears stable")
             else:
-                stable_count = 0
-                
-            previous_content_size = content_size
-            await page.wait_for_timeout(1000)  # Wait a second between checks
+                logger.debug("Content still changing, continuing anyway")
         
-        # Try scrolling to load any lazy content
-        await page.evaluate('''() => {
-            window.scrollTo(0, document.body.scrollHeight / 2);
-            setTimeout(() => { window.scrollTo(0, document.body.scrollHeight); }, 500);
-        }''')
-        await page.wait_for_timeout(1500)  # Wait for lazy loading to complete
+            # Try scrolling to load any lazy content, then wait for it to finish rendering
+            await page.evaluate('''() => {
+                window.scrollTo(0, document.body.scrollHeight / 2);
+                setTimeout(() => { window.scrollTo(0, document.body.scrollHeight); }, 500);
+            }''')
+            page.set_default_timeout(_remaining_ms(deadline))
+            await page.evaluate(WAIT_FOR_DOM_QUIET_JS, [700, min(1500, _remaining_ms(deadline))])
         
-        # Get HTML content after all interactions
-        html_content = await page.content()
-        logger.info(f"📄 Got HTML content: {len(html_content)} bytes")
+            # Get HTML content after all interactions
+            page.set_default_timeout(_remaining_ms(deadline))
+            html_content = await page.content()
+            logger.info("📄 Got HTML content: %s bytes", len(html_content))
         
-        # Clean the HTML response
-        cleaned_data = clean_html_response(html_content)
+            # Clean the HTML response off the browser loop, so other scrapes keep driving their pages
+            cleaned_data = await asyncio.get_running_loop().run_in_executor(None, clean_html_response, html_content)
         
-        # Check if cleaned content is mostly about cookies/consent
-        content_text = cleaned_data.get("content", "")
-        if content_text and len(content_text) < 200 or "cookie" in content_text.lower()[:100]:
-            logger.warning("⚠️ Initial content appears to be cookie-related. Trying alternative extraction...")
+            # Check if cleaned content is mostly about cookies/consent
+            content_text = cleaned_data.get("content", "")
+            if content_text and len(content_text) < 200 or "cookie" in content_text[:100].lower():
+                logger.warning("⚠️ Initial content appears to be cookie-related. Trying alternative extraction...")
             
-            # Take a screenshot for debugging if content is cookie-related
-            await page.screenshot(path="/tmp/cookie_page.png")
-            logger.info("📸 Saved screenshot to /tmp/cookie_page.png")
-            
-            # Try to extract content directly from page
-            extracted_content = await page.evaluate('''() => {
-                // Remove cookie-related content
-                const cookieElements = document.querySelectorAll('[id*="cookie"], [class*="cookie"], [id*="consent"], [class*="consent"], [id*="gdpr"], [class*="gdpr"]');
-                cookieElements.forEach(el => el.remove());
+                # Try to extract content directly from page
+                extracted_content = await page.evaluate('''() => {
+                    // Remove cookie-related content
+                    const cookieElements = document.querySelectorAll('[id*="cookie"], [class*="cookie"], [id*="consent"], [class*="consent"], [id*="gdpr"], [class*="gdpr"]');
+                    cookieElements.forEach(el => el.remove());
                 
-                // Try to get main content
-                const mainContent = document.querySelector('main') || document.querySelector('article');
-                if (mainContent) return mainContent.innerText;
+                    // Try to get main content
+                    const mainContent = document.querySelector('main') || document.querySelector('article');
+                    if (mainContent) return mainContent.innerText;
                 
-                // Fallback to paragraphs
-                const paragraphs = Array.from(document.querySelectorAll('p')).map(p => p.innerText).filter(text => text.length > 50);
-                return paragraphs.join('\n\n');
-            }''')
+                    // Fallback to paragraphs
+                    const paragraphs = Array.from(document.querySelectorAll('p')).map(p => p.innerText).filter(text => text.length > 50);
+                    return paragraphs.join('\n\n');
+                }''')
             
-            if extracted_content and len(extracted_content) > 200:
-                logger.info(f"🔄 Alternative extraction successful: {len(extracted_content)} characters")
-                cleaned_data["content"] = extracted_content
-        
-        elapsed_time = time.time() - start_time
-        logger.info(f"⏱️ Scraping completed in {elapsed_time:.2f} seconds")
-        
-        # Add scraping metadata
-        cleaned_data["metadata"] = {
-            "scrape_time": elapsed_time,
-            "url": url,
-            "status_code": status,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        return cleaned_data
-        
+                if extracted_content and len(extracted_content) > 200:
+                    logger.info("🔄 Alternative extraction successful: %s characters", len(extracted_content))
+                    cleaned_data["content"] = extracted_content
+        
+            elapsed_time = time.time() - start_time
+            logger.info("⏱️ Scraping completed in %.2f seconds", elapsed_time)
+        
+            # Add scraping metadata
+            cleaned_data["metadata"] = {
+                "scrape_time": elapsed_time,
+                "url": url,
+                "status_code": status,
+                "renderer": "browser",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+            return cleaned_data
+
+    except DomainBusy as e:
+        logger.warning("🚦 %s, rejecting scrape", e)
+        return {"error": "Too many scrapes of this host, retry later"}, 429
+    except BrowserPoolExhausted:
+        raise
     except Exception as e:
-        logger.error(f"❌ Error during scraping: {str(e)}")
+        logger.error("❌ Error during scraping: %s", e)
         return {"error": str(e)}
-        
-    finally:
-        if browser:
-            logger.info(" Closing browser")
-            await browser.close()
 
-def clean_html_response(html_content):
-    """
-    Clean and structure HTML content using BeautifulSoup.
-    More aggressively extracts only property-relevant information.
-    """
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Remove script, style, and footer elements
-    for element in soup(['script', 'style', 'footer', 'iframe', 'header', 'nav']):
-        element.decompose()
-        
-    # Remove all elements containing policy-related content
-    policy_terms = ['cookie', 'gdpr', 'privacy', 'policy', 'villkor', 'consent', 'personuppgift', 
-                   'integritet', 'acceptera', 'godkänn', 'samtycke', 'rättigheter',
-                   'accept', 'allow', 'datapolicy', 'dataskydd']
-                   
-    # Remove common non-content elements by ID, class, and role
-    non_content_selectors = [
-        '[id*="cookie"]', '[class*="cookie"]', '[id*="consent"]', '[class*="consent"]',
-        '[id*="gdpr"]', '[class*="gdpr"]', '[id*="privacy"]', '[class*="privacy"]',
-        '[id*="popup"]', '[class*="popup"]', '[id*="modal"]', '[class*="modal"]',
-        '[id*="banner"]', '[class*="banner"]', '[id*="alert"]', '[class*="alert"]',
-        '[id*="dialog"]', '[class*="dialog"]', '[id*="notice"]', '[class*="notice"]',
-        '[id*="overlay"]', '[class*="overlay"]', '[id*="notification"]', '[class*="notification"]',
-        '[id*="menu"]', '[class*="menu"]', '[id*="nav"]', '[class*="nav"]',
-        '[id*="header"]', '[class*="header"]', '[id*="footer"]', '[class*="footer"]',
-        '[id*="sidebar"]', '[class*="sidebar"]', '[id*="aside"]', '[class*="aside"]',
-        '[role="banner"]', '[role="navigation"]', '[role="complementary"]', '[role="contentinfo"]',
-        '[aria-label*="cookie"]', '[aria-labelledby*="cookie"]',
-        '[data-testid*="cookie"]', '[data-id*="cookie"]'
-    ]
-    
-    for selector in non_content_selectors:
-        for element in soup.select(selector):
-            element.decompose()
-    
-    # First pass: remove elements with policy terms in their attributes
-    for element in soup.find_all(lambda tag: any(term in (str(tag.get('id', '')) + str(tag.get('class', '')) + str(tag.get('title', ''))).lower() for term in policy_terms)):
-        element.decompose()
-    
-    # Second pass: remove elements with policy terms in their text
-    for element in soup.find_all(text=lambda text: text and any(term in text.lower() for term in policy_terms)):
-        parent = element.parent
-        if parent:
-            parent.decompose()
-    
-    # Get title - prefer h1 over title tag
-    title = ""
-    h1 = soup.find('h1')
-    if h1:
-        title = h1.get_text(strip=True)
-    elif soup.title:
-        title = soup.title.string
-    
-    # Get meta description
-    meta_desc = ""
-    meta_tag = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
-    if meta_tag and meta_tag.get('content'):
-        meta_desc = meta_tag['content']
-    
-    # Extract main content using multiple strategies
-    content_text = ""
-    
-    # Strategy 1: Look for property-specific containers
-    property_classes = [
-        'property-info', 'property-details', 'listing-details', 'object-info',
-        'property-description', 'estate-info', 'listing-description', 'main-content',
-        'content-main', 'article', 'main', 'content-area', 'page-content'
-    ]
-    
-    # Try each class separately to find meaningful content
-    for cls in property_classes:
-        elements = soup.find_all(class_=lambda x: x and cls.lower() in x.lower())
-        if elements:
-            for element in elements:
-                text = element.get_text(separator=' ', strip=True)
-                if len(text) > 100 and not any(term in text.lower() for term in policy_terms):
-                    content_text = text
-                    break
-            if content_text:
-                break
-    
-    # Try finding by semantic HTML elements if no property-specific class found
-    if not content_text:
-        for tag in ['main', 'article']:
-            elements = soup.find_all(tag)
-            if elements:
-                for element in elements:
-                    text = element.get_text(separator=' ', strip=True)
-                    if len(text) > 100 and not any(term in text.lower() for term in policy_terms):
-                        content_text = text
-                        break
-                if content_text:
-                    break
-    
-    # Strategy 2: If no property container found, look for specific sections
-    if not content_text:
-        # Find sections that likely contain property details
-        sections = []
-        # Check for transportation info
-        transport = soup.find_all(string=lambda text: text and any(term in text.lower() for term in ['kollektivt', 'kommunikation', 'pendel', 'transport', 'buss', 'station']))
-        for t in transport:
-            if t.parent and len(t.parent.get_text(strip=True)) > 50:
-                sections.append(t.parent.get_text(separator=' ', strip=True))
-        
-        # Check for property features
-        features = soup.find_all(string=lambda text: text and any(term in text.lower() for term in ['parkering', 'garage', 'restaurang', 'service', 'hyresgäst']))
-        for f in features:
-            if f.parent and len(f.parent.get_text(strip=True)) > 50:
-                sections.append(f.parent.get_text(separator=' ', strip=True))
-        
-        # Combine the sections if we found any
-        if sections:
-            content_text = ' '.join(sections)
+def _scrape_url(url):
+    """Scrape one URL end to end; returns (payload, status_code) for the caller to serialise"""
+    start_time = time.time()
+
+    # Check if scraping is allowed
+    try:
+        if not is_scraping_allowed(url, SCRAPE_SESSION):
+            logger.error("🚫 Scraping not allowed for %s", url)
+            return {"error": "Scraping not allowed by robots.txt"}, 403
+    except Exception as e:
+        logger.warning("⚠️ Error checking robots.txt: %s", e)
     
-    # Strategy 3: Last resort - collect all substantial paragraphs
-    if not content_text or len(content_text) < 100:
-        paragraphs = []
-        for p in soup.find_all('p'):
-            text = p.get_text(strip=True)
-            if len(text) > 30 and not any(term in text.lower() for term in policy_terms):
-                paragraphs.append(text)
+    try:
+        # The wait for the host, the HTTP-first attempt and the browser all share one MAX_SCRAPE_TIME budget
+        deadline = time.monotonic() + MAX_SCRAPE_TIME
+        _wait_for_domain_slot(url)
+
+        # HTTP-first; only fall back to the shared browser for client-rendered pages
+        result = scrape_static(url, deadline)
+        if result is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("No time left for the browser")
+            # wait_for cancels the scrape at the deadline; its context is wiped and returned to the pool
+            result = BROWSER_POOL.run(asyncio.wait_for(scrape_with_playwright(url, deadline), remaining))
+            
+        elapsed_time = time.time() - start_time
+        logger.info("⏱️ Total request time: %.2f seconds", elapsed_time)
         
-        if paragraphs:
-            content_text = ' '.join(paragraphs)
-    
-    # Filter out policy text sentences
-    if content_text:
-        clean_sentences = []
-        for sentence in re.split(r'(?<=[.!?])\s+', content_text):
-            if len(sentence) > 10 and not any(term in sentence.lower() for term in policy_terms):
-                clean_sentences.append(sentence)
+        # Add request timing to response
+        if isinstance(result, dict) and "metadata" in result:
+            result["metadata"]["total_request_time"] = elapsed_time
         
-        content_text = ' '.join(clean_sentences)
-    
-    # Extract the actual property information from the start of the description
-    if "Kontorsfastighet" in content_text:
-        property_start = content_text.find("Kontorsfastighet")
-        if property_start >= 0:
-            # Only keep text from this point forward
-            content_text = content_text[property_start:]
+        return result, 200
     
-    # Clean up the text
-    content_text = re.sub(r'\s+', ' ', content_text).strip()
-    
-    return {
-        "title": title,
-        "description": meta_desc,
-        "content": content_text
-    }
+    except DomainBusy as e:
+        logger.warning("🚦 %s, rejecting scrape", e)
+        return {"error": "Too many scrapes of this host, retry later"}, 429
+    except BrowserPoolExhausted:
+        logger.warning("🚦 No browser context free, rejecting scrape")
+        return {"error": "Scraper busy, retry later"}, 503
+    except TimeoutError:
+        logger.error("⏱️ Scrape exceeded %s seconds", MAX_SCRAPE_TIME)
+        return {"error": "Scrape timed out"}, 504
+    except Exception as e:
+        logger.error("🚨 Error in scrape endpoint: %s", e)
+        return {"error": str(e)}, 500
 
 @app.route('/scrape', methods=['POST'])
 def scrape():
     """
     Endpoint for scraping a website and extracting content
     """
-    start_time = time.time()
     logger.info("📥 Received scrape request")
 
     # Check request format
@@ -607,111 +649,121 @@ def scrape():
         logger.error("❌ No URL provided")
         return jsonify({"error": "URL is required"}), 400
     
-    url = req_data['url']
-    
-    # Check if scraping is allowed
-    try:
-        if not is_scraping_allowed(url):
-            logger.error(f"🚫 Scraping not allowed for {url}")
-            return jsonify({"error": "Scraping not allowed by robots.txt"}), 403
-    except Exception as e:
-        logger.warning(f"⚠️ Error checking robots.txt: {str(e)}")
-    
-    # Run the scraping in a synchronous wrapper around the async function
-    try:
-        import asyncio
-        # Check if we're already in an event loop
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # Create a new loop for this request
-                new_loop = asyncio.new_event_loop()
-                result = new_loop.run_until_complete(scrape_with_playwright(url))
-                new_loop.close()
-            else:
-                result = loop.run_until_complete(scrape_with_playwright(url))
-        except RuntimeError:
-            # No event loop exists yet
-            result = asyncio.run(scrape_with_playwright(url))
-            
-        elapsed_time = time.time() - start_time
-        logger.info(f"⏱️ Total request time: {elapsed_time:.2f} seconds")
-        
-        # Add request timing to response
-        if isinstance(result, dict) and "metadata" in result:
-            result["metadata"]["total_request_time"] = elapsed_time
-        
-        return jsonify(result)
-    
-    except Exception as e:
-        logger.error(f"🚨 Error in scrape endpoint: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    payload, status = _scrape_url(req_data['url'])
+    return jsonify(payload), status
+
+@app.route('/scrape_batch', methods=['POST'])
+def scrape_batch():
+    """
+    Scrape several URLs in one request. URLs run concurrently, each through the same
+    HTTP-first/browser pipeline as /scrape; results come back in request order.
+    """
+    logger.info("📥 Received batch scrape request")
+
+    if not request.is_json:
+        logger.error("❌ Request is not JSON")
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    req_data = request.get_json()
+    urls = req_data.get('urls') if isinstance(req_data, dict) else None
+    if not isinstance(urls, list) or not urls:
+        logger.error("❌ No URLs provided")
+        return jsonify({"error": "urls must be a non-empty list"}), 400
+    if not all(isinstance(url, str) for url in urls):
+        return jsonify({"error": "urls must be strings"}), 400
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({"error": f"At most {MAX_BATCH_URLS} URLs per batch"}), 400
+
+    # One worker per pooled browser context, so browser fallbacks do not starve each other
+    with ThreadPoolExecutor(max_workers=min(len(urls), MAX_BROWSER_CONTEXTS), thread_name_prefix="scrape-batch") as executor:
+        outcomes = list(executor.map(_scrape_url, urls))
+
+    return jsonify({"results": [
+        {"url": url, "status": status, "result": payload}
+        for url, (payload, status) in zip(urls, outcomes)
+    ]})
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"PDF exceeds {MAX_PDF_BYTES // (1024 * 1024)}MB limit"}), 413
 
 @app.route("/parse", methods=["POST"])
 def parse():
     """Enhanced parse endpoint with better error handling and timeouts"""
     start_time = time.time()
+    # Reject oversized uploads before the multipart body is parsed
+    if request.content_length and request.content_length > MAX_PDF_BYTES:
+        return jsonify({"error": f"PDF exceeds {MAX_PDF_BYTES // (1024 * 1024)}MB limit"}), 413
+
     file = request.files.get("file")
     space_id = request.form.get("space_id")
 
     if not file or not space_id:
         return jsonify({"error": "Missing file or space_id"}), 400
 
-    # Create unique temporary directory
-    temp_dir = f"/tmp/pdf_processing_{uuid.uuid4()}"
-    os.makedirs(temp_dir, exist_ok=True)
-    file_path = os.path.join(temp_dir, file.filename)
+    # Private per-request directory for extracted images (honours TMPDIR)
+    temp_dir = tempfile.mkdtemp(prefix="pdf_processing_")
+    upload = None
     
-    logger.info(f"Starting PDF processing for file: {file.filename}")
+    logger.info("Starting PDF processing for file: %s", file.filename)
     
     try:
-        # Save file with timeout protection
-        with timeout(seconds=30):
-            file.save(file_path)
+        # Read the upload with timeout protection; PyMuPDF opens small ones from bytes
+        pdf_source = run_with_timeout(30, _read_upload, file, temp_dir)
             
         result = {"status": "processing"}
-        
-        # Extract text with timeout
-        try:
-            with timeout(seconds=120):
-                parsed_text = parse_pdf_text(file_path)
-                result["text"] = parsed_text
-        except TimeoutError:
-            result["text_error"] = "Text extraction timed out"
-            logger.error("Text extraction timed out")
-        except Exception as e:
-            result["text_error"] = str(e)
-            logger.error(f"Text extraction failed: {str(e)}")
 
-        # Extract and upload images with timeout
+        # Extract text and images in a single pass with timeout; each page range's images
+        # start uploading as soon as they are written
+        upload = RailsImageUpload(space_id)
+        extracted = False
         try:
-            with timeout(seconds=180):
-                image_paths = extract_images_from_pdf(file_path, os.path.join(temp_dir, "images"))
-                if image_paths:
-                    logger.info(f"Uploading {len(image_paths)} images")
-                    image_upload_result = send_images_to_rails(image_paths, space_id)
-                    result["image_upload_result"] = image_upload_result
+            parsed_text, image_paths = run_with_timeout(
+                PDF_EXTRACT_TIMEOUT, extract_text_and_images, pdf_source, os.path.join(temp_dir, "images"),
+                IMAGE_WORKERS, PDF_PROCESS_WORKERS, upload.submit, time.time() + PDF_EXTRACT_TIMEOUT
+            )
+            result["text"] = parsed_text
+            extracted = True
+            logger.info("Uploading %s images", len(image_paths))
         except TimeoutError:
-            result["image_error"] = "Image processing timed out"
-            logger.error("Image processing timed out")
+            result["text_error"] = result["image_error"] = "PDF extraction timed out"
+            logger.error("PDF extraction timed out")
         except Exception as e:
-            result["image_error"] = str(e)
-            logger.error(f"Image processing failed: {str(e)}")
+            result["text_error"] = result["image_error"] = str(e)
+            logger.error("PDF extraction failed: %s", e)
+        upload.close()
+
+        # Wait for the uploads with timeout
+        if len(upload):
+            if not extracted:
+                # Earlier page ranges were already sent; tell the caller Rails holds only some images
+                result["partial"] = True
+            try:
+                result["image_upload_result"] = upload.result(timeout=180)
+            except TimeoutError:
+                result["image_error"] = "Image upload timed out"
+                logger.error("Image upload timed out")
+            except Exception as e:
+                result["image_error"] = str(e)
+                logger.error("Image upload failed: %s", e)
 
         processing_time = time.time() - start_time
-        logger.info(f"PDF processing completed in {processing_time:.1f} seconds")
+        logger.info("PDF processing completed in %.1f seconds", processing_time)
         return jsonify(result)
 
     except TimeoutError:
         logger.error("Request timed out")
         return jsonify({"error": "Request timed out"}), 504
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error: %s", e)
         return jsonify({"error": str(e)}), 500
     finally:
+        # Batches still queued would read images from the directory removed below
+        if upload is not None:
+            upload.close(cancel_pending=True)
         # Clean up temporary files
         try:
             shutil.rmtree(temp_dir, ignore_errors=True)
             logger.info("Cleaned up temporary files")
         except Exception as e:
-            logger.error(f"Failed to clean up temporary files: {str(e)}")
\ No newline at end of file
+            logger.error("Failed to clean up temporary files: %s", e)
\ No newline at end of file
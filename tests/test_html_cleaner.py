@@ -0,0 +1,19 @@
+from utils.html_cleaner import clean_html_response
+
+
+def test_header_nav_footer_contents_are_dropped():
+    html = """<html><head><title>T</title></head><body>
+    <header><h1>Site Brand</h1><div>Parkering i garage under huset för alla hyresgäster i området.</div></header>
+    <nav><ul><li>Station och buss: alla linjer som går till kontoret från centrum varje dag.</li></ul></nav>
+    <footer><div>Restaurang och service i huset, öppet för hyresgäster alla vardagar.</div></footer>
+    </body></html>"""
+    assert clean_html_response(html) == {"title": "T", "description": "", "content": ""}
+
+
+def test_main_content_is_kept():
+    html = """<html><head><title>T</title></head><body><header><h1>Site Brand</h1></header>
+    <main><h1>Kontor i Solna</h1><p>Ljusa kontorslokaler om 5000 kvm med utsikt över vattnet och goda kommunikationer.</p></main>
+    </body></html>"""
+    result = clean_html_response(html)
+    assert result["title"] == "Kontor i Solna"
+    assert result["content"] == "Ljusa kontorslokaler om 5000 kvm med utsikt över vattnet och goda kommunikationer."
@@ -0,0 +1,151 @@
+import asyncio
+import atexit
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolExhausted(Exception):
+    """No browser context became free within the checkout timeout"""
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium instance shared by every scrape request.
+
+    Playwright's async objects are bound to the event loop that created them, so the
+    browser lives on a dedicated loop thread and request handlers submit coroutines
+    to it. A fixed set of BrowserContexts is created up front and checked out per
+    request. On return a context's pages are closed and its cookies cleared; origin
+    storage (localStorage, IndexedDB) and the HTTP cache are kept, and only go away
+    when the context is replaced after max_context_uses checkouts. Pass
+    service_workers="block" in context_options so no worker outlives its page.
+    The browser is only closed at process exit.
+    """
+    def __init__(self, executable_path=None, max_contexts=4, max_context_uses=20,
+                 context_options=None, setup_context=None):
+        self.executable_path = executable_path
+        self.max_contexts = max_contexts
+        self.max_context_uses = max_context_uses
+        self.context_options = context_options or {}
+        self.setup_context = setup_context  # async callable run once on every new context
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="playwright-loop", daemon=True)
+        self._lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._idle = None
+        self._relaunch_lock = None
+
+    def start(self):
+        """Start the loop thread, launch Chromium and fill the context pool (idempotent)"""
+        with self._lock:
+            if self._browser:
+                return
+            self._thread.start()
+            self.run(self._launch())
+            atexit.register(self.close)
+
+    async def _launch(self):
+        self._playwright = await async_playwright().start()
+        self._browser = await self._launch_browser()
+        self._relaunch_lock = asyncio.Lock()
+        self._idle = asyncio.Queue()
+        for _ in range(self.max_contexts):
+            await self._idle.put((await self._new_context(), 0))
+        logger.info("🚀 Browser launched (%s pooled contexts)", self.max_contexts)
+
+    async def _launch_browser(self):
+        return await self._playwright.chromium.launch(
+            executable_path=self.executable_path,
+            headless=True
+        )
+
+    async def _ensure_browser(self):
+        """Relaunch Chromium if it crashed or was killed (e.g. by the OOM killer)"""
+        if self._browser.is_connected():
+            return
+        async with self._relaunch_lock:
+            if self._browser.is_connected():
+                return
+            logger.warning("⚠️ Browser disconnected, relaunching")
+            self._browser = await self._launch_browser()
+
+    async def _new_context(self):
+        context = await self._browser.new_context(**self.context_options)
+        if self.setup_context:
+            await self.setup_context(context)
+        return context
+
+    async def _discard(self, context):
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug("Failed to close browser context: %s", e)
+
+    async def _reset(self, context):
+        """Close the request's pages and clear cookies; origin storage survives until the context is recycled"""
+        for page in context.pages:
+            await page.close()
+        await context.clear_cookies()
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the browser loop and block until it finishes"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(timeout)
+
+    @asynccontextmanager
+    async def context(self, checkout_timeout=None):
+        """
+        Check out a pooled BrowserContext for one request.
+        Raises BrowserPoolExhausted if none is free within checkout_timeout seconds.
+        """
+        try:
+            context, uses = await asyncio.wait_for(self._idle.get(), checkout_timeout)
+        except asyncio.TimeoutError:
+            raise BrowserPoolExhausted("All browser contexts are busy") from None
+
+        try:
+            await self._ensure_browser()
+            # Contexts die with a crashed browser, and are recycled after max_context_uses
+            if context is None or context.browser is not self._browser or uses >= self.max_context_uses:
+                if context is not None:
+                    await self._discard(context)
+                context, uses = None, 0
+                context = await self._new_context()
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await self._reset(context)
+                    uses += 1
+                except Exception as e:
+                    # A context that cannot be wiped is replaced on its next checkout
+                    logger.warning("⚠️ Dropping browser context: %s", e)
+                    await self._discard(context)
+                    context, uses = None, 0
+            self._idle.put_nowait((context, uses))
+
+    async def _shutdown(self):
+        if self._browser:
+            await self._browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+
+    def close(self):
+        """Close the browser and stop Playwright; registered with atexit"""
+        with self._lock:
+            if not self._browser:
+                return
+            logger.info("Closing browser")
+            try:
+                self.run(self._shutdown(), timeout=10)
+            except Exception as e:
+                logger.error("Failed to close browser: %s", e)
+            finally:
+                self._browser = None
+                self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,193 @@
+import re
+
+MAX_HTML_CHARS = 512_000  # listing content sits near the top; cap what BeautifulSoup parses
+
+# Policy-related content, matched with one C-level search instead of a per-term loop
+POLICY_TERMS = ['cookie', 'gdpr', 'privacy', 'policy', 'villkor', 'consent', 'personuppgift',
+                'integritet', 'acceptera', 'godkänn', 'samtycke', 'rättigheter',
+                'accept', 'allow', 'datapolicy', 'dataskydd']
+POLICY_RE = re.compile("|".join(map(re.escape, POLICY_TERMS)), re.IGNORECASE)
+
+# Common non-content elements, by tag name, id/class substring, role and cookie markers
+NON_CONTENT_TAGS = {'script', 'style', 'footer', 'iframe', 'header', 'nav'}
+NON_CONTENT_ATTR_RE = re.compile(
+    'cookie|consent|gdpr|privacy|popup|modal|banner|alert|dialog|notice|overlay|notification'
+    '|menu|nav|header|footer|sidebar|aside'
+)
+NON_CONTENT_ROLES = {'banner', 'navigation', 'complementary', 'contentinfo'}
+COOKIE_MARKER_ATTRS = ('aria-label', 'aria-labelledby', 'data-testid', 'data-id')
+TEXT_REMOVAL_EXEMPT = {'html', 'body', '[document]'}  # containers never dropped for their loose text
+
+# Property-specific containers, in order of preference
+PROPERTY_CLASSES = [
+    'property-info', 'property-details', 'listing-details', 'object-info',
+    'property-description', 'estate-info', 'listing-description', 'main-content',
+    'content-main', 'article', 'main', 'content-area', 'page-content'
+]
+PROPERTY_CLASS_RE = re.compile("|".join(map(re.escape, PROPERTY_CLASSES)))
+TRANSPORT_RE = re.compile('kollektivt|kommunikation|pendel|transport|buss|station', re.IGNORECASE)
+FEATURES_RE = re.compile('parkering|garage|restaurang|service|hyresgäst', re.IGNORECASE)
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+def _is_non_content(tag, id_attr, class_attr):
+    """Whether a tag is navigation, consent or policy chrome rather than page content"""
+    # Most tags carry no attributes at all; only their name can mark them
+    if not tag.attrs:
+        return tag.name in NON_CONTENT_TAGS
+    return (
+        tag.name in NON_CONTENT_TAGS
+        or NON_CONTENT_ATTR_RE.search(id_attr) is not None
+        or NON_CONTENT_ATTR_RE.search(class_attr) is not None
+        or tag.get('role') in NON_CONTENT_ROLES
+        or any('cookie' in tag.get(attr, '') for attr in COOKIE_MARKER_ATTRS)
+        or POLICY_RE.search(f"{id_attr} {class_attr} {tag.get('title', '')}") is not None
+    )
+
+def _walk_soup(soup):
+    """
+    Single pass over the parsed page: remove non-content and policy elements, and
+    collect the candidates each extraction strategy needs, in document order.
+    Candidates can still be removed later in the walk, so check .decomposed before use.
+    """
+    from bs4 import NavigableString
+
+    found = {
+        "h1": [], "meta_desc": [], "og_desc": [], "main": [], "article": [], "p": [],
+        "property": [[] for _ in PROPERTY_CLASSES], "transport": [], "features": [],
+    }
+    for node in list(soup.descendants):
+        if node.decomposed:
+            continue
+
+        if isinstance(node, NavigableString):
+            if POLICY_RE.search(node):
+                # Loose text directly under <body> must not take the whole page with it
+                if node.parent is not None and node.parent.name not in TEXT_REMOVAL_EXEMPT:
+                    node.parent.decompose()
+                continue
+            if TRANSPORT_RE.search(node):
+                found["transport"].append(node)
+            if FEATURES_RE.search(node):
+                found["features"].append(node)
+            continue
+
+        id_attr = node.get('id', '')
+        class_attr = ' '.join(node.get('class', ()))
+        if _is_non_content(node, id_attr, class_attr):
+            node.decompose()
+            continue
+
+        name = node.name
+        if name in ('h1', 'main', 'article', 'p'):
+            found[name].append(node)
+        elif name == 'meta':
+            if node.get('name') == 'description':
+                found["meta_desc"].append(node)
+            elif node.get('property') == 'og:description':
+                found["og_desc"].append(node)
+
+        if class_attr:
+            class_lower = class_attr.lower()
+            if PROPERTY_CLASS_RE.search(class_lower):
+                for bucket, cls in zip(found["property"], PROPERTY_CLASSES):
+                    if cls in class_lower:
+                        bucket.append(node)
+
+    return found
+
+def _alive(nodes):
+    return [node for node in nodes if not node.decomposed]
+
+def clean_html_response(html_content):
+    """
+    Clean and structure HTML content using BeautifulSoup.
+    More aggressively extracts only property-relevant information.
+    """
+    # Imported lazily, only the scrape path needs bs4
+    from bs4 import BeautifulSoup
+
+    # lxml copes with the markup cut off mid-tag. The whole tree is built: header, nav
+    # and footer wrappers must be seen by _walk_soup for their contents to be dropped
+    soup = BeautifulSoup(html_content[:MAX_HTML_CHARS], 'lxml')
+    found = _walk_soup(soup)
+
+    # Get title - prefer h1 over title tag
+    title = ""
+    h1 = next(iter(_alive(found["h1"])), None)
+    if h1:
+        title = h1.get_text(strip=True)
+    elif soup.title:
+        title = soup.title.string
+    
+    # Get meta description
+    meta_desc = ""
+    meta_tag = next(iter(_alive(found["meta_desc"]) + _alive(found["og_desc"])), None)
+    if meta_tag and meta_tag.get('content'):
+        meta_desc = meta_tag['content']
+    
+    # Extract main content using multiple strategies
+    content_text = ""
+    
+    # Strategy 1: Look for property-specific containers, then semantic HTML elements.
+    # An element can sit in several buckets (e.g. <main class="main-content">); once
+    # rejected it is not flattened to text again
+    rejected = set()
+    for elements in found["property"] + [found["main"], found["article"]]:
+        for element in _alive(elements):
+            if id(element) in rejected:
+                continue
+            text = element.get_text(separator=' ', strip=True)
+            if len(text) > 100 and not POLICY_RE.search(text):
+                content_text = text
+                break
+            rejected.add(id(element))
+        if content_text:
+            break
+    
+    # Strategy 2: If no property container found, look for transportation info and property features
+    if not content_text:
+        sections = []
+        for string in _alive(found["transport"]) + _alive(found["features"]):
+            if string.parent and len(string.parent.get_text(strip=True)) > 50:
+                sections.append(string.parent.get_text(separator=' ', strip=True))
+        
+        # Combine the sections if we found any
+        if sections:
+            content_text = ' '.join(sections)
+    
+    # Strategy 3: Last resort - collect all substantial paragraphs
+    if not content_text or len(content_text) < 100:
+        paragraphs = []
+        for p in _alive(found["p"]):
+            text = p.get_text(strip=True)
+            if len(text) > 30 and not POLICY_RE.search(text):
+                paragraphs.append(text)
+        
+        if paragraphs:
+            content_text = ' '.join(paragraphs)
+    
+    # Filter out policy text sentences
+    if content_text:
+        clean_sentences = []
+        for sentence in SENTENCE_SPLIT_RE.split(content_text):
+            if len(sentence) > 10 and not POLICY_RE.search(sentence):
+                clean_sentences.append(sentence)
+        
+        content_text = ' '.join(clean_sentences)
+    
+    # Extract the actual property information from the start of the description
+    if "Kontorsfastighet" in content_text:
+        property_start = content_text.find("Kontorsfastighet")
+        if property_start >= 0:
+            # Only keep text from this point forward
+            content_text = content_text[property_start:]
+    
+    # Clean up the text
+    content_text = WHITESPACE_RE.sub(' ', content_text).strip()
+    
+    return {
+        "title": title,
+        "description": meta_desc,
+        "content": content_text
+    }
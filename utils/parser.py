@@ -1,9 +1,229 @@
-import pdfplumber
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # Skip embedded images larger than this
+PASSTHROUGH_IMAGE_FILTERS = ("/DCTDecode", "/JPXDecode")  # extract_image returns these streams unchanged
+PARALLEL_MIN_PAGES = 20  # Smaller documents are not worth shipping to worker processes
+MIN_PAGES_PER_TASK = 10  # Smallest page range handed to a worker process
+MAX_PAGES_PER_TASK = 500  # Largest page range, bounds what one task holds in memory
+TASKS_PER_WORKER = 4  # Page ranges per worker, for load balancing
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
 
 def parse_pdf(path):
-    text = ""
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-            text += "\n\n"
-    return text.strip()
\ No newline at end of file
+    parts = []
+    with fitz.open(path) as doc:
+        for page in doc:
+            page_text = page.get_text("text")
+            if page_text:
+                parts.append(page_text)
+    return "\n\n".join(parts).strip()
+
+def _get_process_pool(max_workers):
+    """Start the shared worker pool on first use; spawned so workers never inherit the browser thread"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+def _discard_process_pool(pool):
+    """Drop a pool whose worker died (OOM kill, MuPDF crash) so the next request starts a fresh one"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _write_image(doc, doc_lock, page_num, i, xref, output_dir):
+    """Extract a single embedded image and write it to disk, returning its path"""
+    try:
+        # MuPDF documents are not thread-safe, only the file write runs in parallel
+        with doc_lock:
+            # JPEG/JPEG 2000 streams are extracted as stored, so their length is known
+            # without copying the image out of the document
+            if doc.xref_get_key(xref, "Filter")[1] in PASSTHROUGH_IMAGE_FILTERS:
+                length_type, length = doc.xref_get_key(xref, "Length")
+                if length_type == "int" and int(length) > MAX_IMAGE_BYTES:
+                    logger.warning("Skipping large image (%.1fMB) on page %s", int(length)/1024/1024, page_num + 1)
+                    return None
+            base_image = doc.extract_image(xref)
+        image_bytes = base_image["image"]
+        ext = base_image["ext"]
+
+        # Skip if image is too large
+        if len(image_bytes) > MAX_IMAGE_BYTES:
+            logger.warning("Skipping large image (%.1fMB) on page %s", len(image_bytes)/1024/1024, page_num + 1)
+            return None
+
+        img_path = os.path.join(output_dir, f"page{page_num+1}_img{i+1}.{ext}")
+        Path(img_path).write_bytes(image_bytes)
+        return img_path
+
+    except Exception as e:
+        logger.error("Failed to extract image %s from page %s: %s", i+1, page_num + 1, e)
+        return None
+
+def _check_deadline(deadline):
+    # Wall-clock time, so the same deadline holds in the parent and in worker processes
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError("PDF extraction exceeded its time budget")
+
+def _extract_pages(doc, start, end, output_dir, image_workers, deadline=None):
+    """
+    Fused text + image pass over pages [start, end) of an open document.
+    Stops with TimeoutError once deadline (a time.time() value) has passed.
+    Returns (page_texts, image_paths) in page order.
+    """
+    text = []
+
+    # Collect text and every (page, index, xref) in the same page walk
+    items = []
+    image_refs = []  # xref of every image occurrence, in page order
+    seen_xrefs = set()
+    for page_num in range(start, end):
+        if (page_num - start) % 10 == 0:
+            logger.info("Processing pages %s-%s", page_num + 1, min(page_num + 10, end))
+        _check_deadline(deadline)
+        # Rebinding page each iteration releases the previous one; no forced GC needed
+        page = doc[page_num]
+        try:
+            text.append(page.get_text("text") or "")
+        except Exception as e:
+            logger.error("Error on page %s: %s", page_num + 1, e)
+            text.append(f"[Error on page {page_num + 1}]")
+
+        images = page.get_images(full=True)
+        if images:
+            logger.info("Found %s images on page %s", len(images), page_num + 1)
+        for n, img in enumerate(images):
+            xref = img[0]
+            image_refs.append(xref)
+            # Images reused across pages (logos, watermarks) are decoded only once
+            if xref not in seen_xrefs:
+                seen_xrefs.add(xref)
+                items.append((page_num, n, xref))
+
+    _check_deadline(deadline)
+    doc_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=image_workers) as executor:
+        results = executor.map(lambda item: _write_image(doc, doc_lock, *item, output_dir), items)
+        written = dict(zip((xref for _, _, xref in items), results))
+
+    image_paths = [written[xref] for xref in image_refs if written[xref]]
+    return text, image_paths
+
+def _open_pdf(source):
+    """Open a PDF from in-memory bytes or from a file path"""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source, filetype="pdf")
+
+def _extract_page_range(source, start, end, output_dir, image_workers, deadline=None):
+    """Pool worker entry point: open a private copy of the document and extract one page range"""
+    with _open_pdf(source) as doc:
+        return _extract_pages(doc, start, end, output_dir, image_workers, deadline)
+
+class _PoolBrokenBeforeResults(BrokenProcessPool):
+    """The pool broke before any page range came back, so the request can safely be retried"""
+
+def _extract_in_processes(source, total_pages, step, output_dir, image_workers, process_workers, on_images, deadline):
+    """Fan page ranges out to the shared process pool; returns (page_texts, image_paths) in page order"""
+    pool = _get_process_pool(process_workers)
+    futures = []
+    text, image_paths = [], []
+    delivered = False
+    try:
+        for start in range(0, total_pages, step):
+            futures.append(pool.submit(_extract_page_range, source, start, min(start + step, total_pages),
+                                       output_dir, image_workers, deadline))
+        for future in futures:
+            range_text, range_paths = future.result()
+            delivered = True
+            text.extend(range_text)
+            image_paths.extend(range_paths)
+            if on_images and range_paths:
+                on_images(range_paths)
+    except BrokenProcessPool as e:
+        _discard_process_pool(pool)
+        if not delivered:
+            raise _PoolBrokenBeforeResults(*e.args) from e
+        raise
+    finally:
+        # After a failure, queued ranges must not keep the shared pool busy
+        # or write into an output_dir the caller is about to delete
+        for future in futures:
+            future.cancel()
+    return text, image_paths
+
+def _select_strategy(total_pages, process_workers):
+    """
+    Size the work for a document. Small ones stay in-process, where spawning tasks costs
+    more than it saves. Larger ones go to the process pool in several ranges per worker,
+    so an image-heavy stretch does not leave the other workers idle and images reach the
+    uploader sooner; huge ones are capped so each range's text and images come back in
+    bounded pieces.
+    """
+    if total_pages < PARALLEL_MIN_PAGES or process_workers < 2:
+        return {"mode": "inline", "pages_per_task": total_pages}
+    pages_per_task = -(-total_pages // (process_workers * TASKS_PER_WORKER))
+    return {"mode": "processes", "pages_per_task": min(MAX_PAGES_PER_TASK, max(MIN_PAGES_PER_TASK, pages_per_task))}
+
+def extract_text_and_images(source, output_dir="/tmp/pdf_images", image_workers=4, process_workers=2, on_images=None, deadline=None):
+    """
+    Walk the PDF once, collecting page text and writing embedded images to output_dir.
+    source is the PDF as bytes, or a path for uploads too large to keep in memory.
+    Large documents are split into page ranges handled by separate worker processes.
+    on_images, if given, is called with each page range's image paths as soon as they are
+    on disk, so callers can start uploading before the whole document is done.
+    deadline (a time.time() value) makes the parent and every worker stop between pages.
+    Returns (text, image_paths).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        with _open_pdf(source) as doc:
+            total_pages = len(doc)
+            strategy = _select_strategy(total_pages, process_workers)
+            logger.info("Starting PDF extraction: %s pages (%s, %s pages per task)",
+                        total_pages, strategy["mode"], strategy["pages_per_task"])
+
+            # Small documents reuse the document opened here instead of parsing it again
+            if strategy["mode"] == "inline":
+                text, image_paths = _extract_pages(doc, 0, total_pages, output_dir, image_workers, deadline)
+                if on_images and image_paths:
+                    on_images(image_paths)
+
+        if strategy["mode"] == "processes":
+            # Each task opens its own copy of the document; a path is sent as-is,
+            # so large uploads are not pickled to every task
+            try:
+                text, image_paths = _extract_in_processes(source, total_pages, strategy["pages_per_task"],
+                                                          output_dir, image_workers, process_workers, on_images, deadline)
+            except _PoolBrokenBeforeResults:
+                # A worker died in an earlier request; nothing was delivered yet, so retry once on a fresh pool
+                logger.warning("Process pool was broken, retrying on a fresh pool")
+                text, image_paths = _extract_in_processes(source, total_pages, strategy["pages_per_task"],
+                                                          output_dir, image_workers, process_workers, on_images, deadline)
+
+        logger.info("PDF extraction completed. Found %s images", len(image_paths))
+
+    except Exception as e:
+        logger.error("PDF parsing failed: %s", e)
+        raise
+
+    return "\n\n".join(text).strip(), image_paths
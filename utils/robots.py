@@ -1,17 +1,101 @@
+import logging
+import re
+import threading
+import time
 import urllib.robotparser
-from urllib.parse import urlparse
+from collections import OrderedDict
+from urllib.parse import quote, unquote, urlparse, urlunparse
 
-def is_scraping_allowed(url):
-    parsed_url = urlparse(url)
-    robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
+import requests
+
+logger = logging.getLogger(__name__)
+
+ROBOTS_TTL = 86400  # Re-fetch a host's robots.txt at most once a day
+ROBOTS_FAILURE_TTL = 60  # Retry unreachable robots.txt soon, without hammering it
+ROBOTS_FETCH_TIMEOUT = 2  # Seconds
+ROBOTS_MAX_BYTES = 500 * 1024  # Google's parser ignores anything past 500KiB
+ROBOTS_CACHE_SIZE = 1024  # Hosts kept; least recently used are evicted first
+
+# (scheme, netloc) -> (expires_at, RobotsRules), in least- to most-recently used order
+_ROBOTS_CACHE = OrderedDict()
+_ROBOTS_LOCK = threading.Lock()
+
+class RobotsRules:
+    """
+    The rules that apply to user-agent '*', compiled into a single regex.
+    Alternatives keep file order, so the first matching line wins, exactly as in
+    RobotFileParser.can_fetch(), but in one C-level match instead of a Python loop.
+    """
+    __slots__ = ("allow_all", "disallow_all", "pattern", "allowances")
+
+    def __init__(self, rp):
+        self.allow_all = rp.allow_all
+        self.disallow_all = rp.disallow_all
+        entry = next((e for e in rp.entries if e.applies_to("*")), rp.default_entry)
+        lines = entry.rulelines if entry else []
+        self.allowances = [line.allowance for line in lines]
+        self.pattern = re.compile("|".join(
+            "()" if line.path == "*" else f"({re.escape(line.path)})" for line in lines
+        )) if lines else None
+
+    def can_fetch(self, url):
+        if self.disallow_all:
+            return False
+        if self.allow_all or self.pattern is None:
+            return True
+        # Same normalisation as RobotFileParser.can_fetch()
+        parsed_url = urlparse(unquote(url))
+        path = quote(urlunparse(("", "", parsed_url.path, parsed_url.params, parsed_url.query, parsed_url.fragment))) or "/"
+        match = self.pattern.match(path)
+        return self.allowances[match.lastindex - 1] if match else True
+
+def _fetch_robots(scheme, netloc, session):
+    robots_url = f"{scheme}://{netloc}/robots.txt"
 
     rp = urllib.robotparser.RobotFileParser()
     rp.set_url(robots_url)
 
+    # Same status handling and UTF-8 decoding as RobotFileParser.read(), but with a bounded
+    # timeout, and streamed so no more than ROBOTS_MAX_BYTES is ever read (gzip is decoded)
+    with session.get(robots_url, timeout=ROBOTS_FETCH_TIMEOUT, stream=True) as response:
+        if response.status_code in (401, 403):
+            rp.disallow_all = True
+        elif 400 <= response.status_code < 500:
+            rp.allow_all = True
+        else:
+            response.raise_for_status()
+            body = response.raw.read(ROBOTS_MAX_BYTES, decode_content=True).decode("utf-8", "replace")
+            rp.parse(body.splitlines())
+    return RobotsRules(rp)
+
+def is_scraping_allowed(url, session=requests):
+    """
+    Check url against its host's cached robots.txt rules.
+    Pass a requests.Session to fetch robots.txt over the caller's pooled connections.
+    """
+    parsed_url = urlparse(url)
+    key = (parsed_url.scheme, parsed_url.netloc)
+
+    with _ROBOTS_LOCK:
+        cached = _ROBOTS_CACHE.get(key)
+        if cached:
+            _ROBOTS_CACHE.move_to_end(key)
+    if cached and time.monotonic() < cached[0]:
+        return cached[1].can_fetch(url)
+
+    ttl = ROBOTS_TTL
     try:
-        rp.read()
-        return rp.can_fetch("*", url)
+        rules = _fetch_robots(*key, session)
     except Exception as e:
-        # If robots.txt is unreachable, you can either default to False or True
-        print(f"⚠️ Failed to read robots.txt: {e}")
-        return False
\ No newline at end of file
+        # If robots.txt is unreachable, disallow for a short while rather than until the next day
+        logger.warning("⚠️ Failed to read robots.txt for %s: %s", parsed_url.netloc, e)
+        rp = urllib.robotparser.RobotFileParser()
+        rp.disallow_all = True
+        rules, ttl = RobotsRules(rp), ROBOTS_FAILURE_TTL
+
+    with _ROBOTS_LOCK:
+        _ROBOTS_CACHE[key] = (time.monotonic() + ttl, rules)
+        _ROBOTS_CACHE.move_to_end(key)
+        while len(_ROBOTS_CACHE) > ROBOTS_CACHE_SIZE:
+            _ROBOTS_CACHE.popitem(last=False)
+    return rules.can_fetch(url)